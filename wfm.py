@@ -1,6 +1,7 @@
 from __future__ import print_function
 
 import collections
+import operator
 import struct
 import array
 import sys
@@ -34,31 +35,60 @@ class FormatError(Exception):
   pass
 
 
-def _parseFile(f, description, leading="<", strict = True):
+_CONDITIONS = {
+  "==": operator.eq,
+  ">=": operator.ge,
+  "<=": operator.le,
+  "<":  operator.lt,
+  ">":  operator.gt,
+  "in": lambda value, match: value in match,
+}
+
+def _compileDescription(description, leading="<"):
   """
-  Parse a binary file according to the provided description.
+  Compile a file description into a layout which can be used by _parseFile.
   
   The description is a list of triples, which contain the fieldname, datatype
-  and a test condition.
+  and a test condition. The binary formats are turned into struct.Struct 
+  objects once, so that parsing a file does not have to do it again.
   """
   
-  data = collections.OrderedDict()
+  layout = []
   
   for field, t, test in description:
     if t == "nested":
-      data[field] = _parseFile(f, test, leading)
+      layout.append((field, None, _compileDescription(test, leading)))
     else:
-      binary_format = leading+t
-      tmp = f.read(struct.calcsize(binary_format))
-      value = struct.unpack(binary_format, tmp)[0]
+      if test:
+        scope, condition, match = test
+        assert scope in ("expect", "require")
+        assert condition in _CONDITIONS
+      layout.append((field, struct.Struct(leading+t), test))
+      
+  return tuple(layout)
+
+def _parseFile(f, layout, strict = True):
+  """
+  Parse a binary file according to the provided layout, which has been
+  created by _compileDescription.
+  """
+  
+  data = collections.OrderedDict()
+  
+  for field, binary_format, test in layout:
+    if binary_format is None:
+      data[field] = _parseFile(f, test, strict)
+    else:
+      tmp = f.read(binary_format.size)
+      if len(tmp) != binary_format.size:
+        raise FormatError("File is truncated at field %s" % field)
+      value = binary_format.unpack(tmp)[0]
       data[field] = value
       
       if test:
         scope, condition, match = test
         
-        assert scope in ("expect", "require")
-        assert condition  in ("==", ">=", "<=", "<", ">", "in")
-        matches = eval("value %s match" % condition)
+        matches = _CONDITIONS[condition](value, match)
         
         if not matches and scope == "require":
           raise FormatError("Field %s %s %s not met, got %s" % (field, condition, match, value))
@@ -68,7 +98,209 @@ def _parseFile(f, description, leading="<", strict = True):
         
   return data
 
-def parseRigolWFM(f, strict=True):
+_CHANNEL_HEADER  = (
+  ("scaleD",     "i", None),
+
+  ("shiftD",     "h", None),
+  ("padding1",   "2s",  ("require", "==", b'\x00'*2)),
+
+  ("probeAtt",   "f", ("require", ">", 0)),
+  ("invertD",    "B", ("require", "in", (0,1))),
+  ("written",    "B", ("require", "in", (0,1))),
+  ("invertM",    "B", ("require", "in", (0,1))),
+  ("padding2",   "1s",  ("require", "==", b'\x00'*1)),
+  ("scaleM",     "i", None),
+  ("shiftM",     "h", None)
+)
+
+_TIME_HEADER  = (
+  ("scaleD",     "q", None),
+  ("delayD",     "q", None),
+  ("smpRate",    "f", ("require", ">=", 0)),
+  ("scaleM",     "q", None),
+  ("delayM",     "q", None)
+)
+
+_TRIGGER_HEADER  = (
+  ("mode",       "B", None),
+  ("source",     "B", None),
+  ("coupling",   "B", None),
+  ("sweep",      "B", None),
+  ("padding1",   "1s",  ("require", "==", b'\x00'*1)),
+  ("sens",       "f", None),
+  ("holdoff",    "f", None),
+  ("level",      "f", None),
+  ("direct",     "B", None),
+  ("pulseType",  "B", None),
+  ("padding2",   "2s",  ("require", "==", b'\x00'*2)),
+  ("PulseWidth", "f", None),
+  ("slopeType",  "B", None),
+  ("padding3",   "3s",  ("require", "==", b'\x00'*3)),
+  ("lower",      "f", None),
+  ("slopeWid",   "f", None),
+  ("videoPol",   "B", None),
+  ("videoSync",  "B", None),
+  ("videoStd",   "B", None)
+)
+
+_LA_HEADER = (
+  # Todo: Try to add logic analyzer
+  ("written",  "B", ("require", "in", (0,1))),
+  ("activeCh", "B", ("require", "in", range(16))),
+  ("enabledChannels", "H", None), # Each bit corresponds to one enabled channel
+  ("position", "16s", None),
+  ("group8to15size", "B", ("require", "in", [7,15])),
+  ("group0to7size", "B", ("require", "in", [7,15]))
+)
+
+_WFM_HEADER = (
+  ("magic",    "H",   ("require", "==", 0xa5a5)),
+  ("padding1", "2s",  ("require", "==", b'\x00'*2)),
+
+  ("unused1",  "4s",   ("expect", "==", b'\x00'*4)),
+  ("unused2",  "4s",   ("expect", "==", b'\x00'*4)),
+  ("unused3",  "4s",   ("expect", "==", b'\x00'*4)),
+
+  ("adcMode",   "B",   ("expect", "in", (0, 1))),
+  ("padding2",  "3s",  ("require", "==", b'\x00'*3)),
+
+  ("rollStop",  "I",  ("expect", "==", 0)),
+  ("unused4",  "4s",   ("expect", "==", b'\x00'*4)),
+
+  ("points1",  "I",   None),
+
+  ("activeCh", "B",   ("require", "in", range(1,6))),
+  ("padding3", "3s",  ("require", "==", b'\x00'*3)),
+
+  ("channel1", "nested", _CHANNEL_HEADER),
+  ("padding4", "2s",  ("require", "==", b'\x00'*2)),
+
+  ("channel2", "nested", _CHANNEL_HEADER),
+
+  ("timeDelayed", "B",  None),
+  ("padding5",    "1s",  ("require", "==", b'\x00'*1)),
+
+  ("time1",    "nested", _TIME_HEADER),
+
+  ("channelLA", "nested", _LA_HEADER),
+
+  ("trigMode", "B",  None),      #FIXME: Add test
+  ("trigHdr1", "nested", _TRIGGER_HEADER),
+  ("trigHdr2", "nested", _TRIGGER_HEADER),
+
+  ("fooG",     "9s", ("expect", "==", b'\x00'*9)),
+  ("points2",  "i", None),
+
+  ("time2",    "nested", _TIME_HEADER)
+)
+
+# There are two known versions of the WFM file format:
+# 1. The presumably older version does not include the laSmpRate 
+#    field.
+# 2. The laSmpRate field is added between the time2 header and
+#    the channel data.
+
+_WFM_HEADER_APPEND_V2 = (
+  ("laSmpRate",  "f",  ("require", ">=", 0)),
+)
+
+_WFM_LAYOUT = _compileDescription(_WFM_HEADER)
+_WFM_LAYOUT_APPEND_V2 = _compileDescription(_WFM_HEADER_APPEND_V2)
+
+def _parseTriggerHdr(trigHdr):
+  """
+  Interpret a raw trigger header.
+  """
+  trgDict = dict()
+  trgDict["mode"] = ("Edge", "Pulse", "Slope", "Video", "Alternate")[trigHdr["mode"]]
+  trgDict["source"] = ("CH1", "CH2", "EXT", "AC Line")[trigHdr["source"]]
+  trgDict["coupling"] = ("DC", "LF Reject", "HF Reject", "AC")[trigHdr["coupling"]]
+  trgDict["sweep"] = ("Auto", "Normal", "Single")[trigHdr["sweep"]]
+  trgDict["holdoff"] = trigHdr["holdoff"]     # Seconds
+  trgDict["sensitivity"] = trigHdr["sens"]    # Volts
+  trgDict["level"] = trigHdr["level"]         # Volts
+
+
+  if trgDict["mode"] in ("Edge",):
+    trgDict["edgeDirection"] = ("RISE", "FALL", "BOTH")[trigHdr["direct"]]
+
+  if trgDict["mode"] in ("Pulse",):
+    trgDict["pulseType"] = ("POS >", "POS <", "POS =", "NEG >", "NEG <", "NEG =")[trigHdr["pulseType"]]
+    trgDict["pulseWidth"] = trigHdr["PulseWidth"]
+
+  if trgDict["mode"] in ("Slope",):
+    trgDict["slopeType"] = ("RISE >", "RISE <", "RISE =", "FALL >", "FALL <", "FALL =")[trigHdr["slopeType"]]
+    trgDict["slopeLowerLevel"] = trigHdr["lower"]  # Volts
+    trgDict["slopeWidth"] = trigHdr["slopeWid"]  # Seconds FIXME: What about slopeWid?
+    trgDict["slope"] = (trgDict["level"] -  trgDict["slopeLowerLevel"]) / trgDict["slopeWidth"] if trgDict["slopeWidth"] else float('inf')      # V/s
+
+  if trgDict["mode"] in ("Video",):
+    trgDict["videoPol"] = ("POS", "NEG")[trigHdr["videoPol"]]
+    trgDict["videoSync"] = ("All Lines", "Line Num", "Odd Field", "Even Field")[trigHdr["videoSync"]]
+    trgDict["videoStd"] = ("NTSC", "PAL/SECAM")[trigHdr["videoStd"]]
+
+  return trgDict
+
+def _validSamples(fileHdr, channelHdr):
+  """
+  Returns the number of valid samples of a channel. In rolling mode, only 
+  the samples up to rollStop are valid.
+  """
+  if fileHdr["rollStop"] == 0:
+    return channelHdr['dataPoints']
+  else:
+    return min(channelHdr['dataPoints'], fileHdr["rollStop"])
+
+# Number of samples which are converted at once by a worker thread
+_CONVERSION_CHUNK_SIZE = 1 << 18
+
+def _chunks(nsamples):
+  """
+  Split nsamples into (start, stop) ranges of at most _CONVERSION_CHUNK_SIZE.
+  """
+  return [(start, min(start + _CONVERSION_CHUNK_SIZE, nsamples)) 
+            for start in range(0, nsamples, _CONVERSION_CHUNK_SIZE)]
+
+# The following conversion kernels work on numpy arrays. They write into a 
+# slice of a preallocated output array. numpy releases the GIL while doing 
+# so, which allows to run several of them in parallel threads.
+
+def _convertVolts(raw, out, scale, shift, sign):
+  import numpy as np
+  np.subtract(125., raw, out=out)
+  out /= 25.
+  out *= scale
+  out -= shift
+  out *= sign
+
+def _convertTime(start, stop, out, samples, timeScale, timeDelay):
+  import numpy as np
+  out[...] = np.arange(start, stop)
+  out -= samples/2
+  out *= timeScale
+  out += timeDelay
+
+def _convertBit(raw, out, bit):
+  import numpy as np
+  np.not_equal(np.bitwise_and(raw, 1<<bit), 0, out=out)
+
+def _timeSamples(channelDict, samples, threads, conversions):
+  """
+  Returns the time of every sample of a channel. If threads are used, the 
+  times are calculated later on by the conversions.
+  """
+  if not threads:
+    return [(t - samples/2) * channelDict["timeScale"] + channelDict["timeDelay"]
+              for t in range(samples)]
+  
+  import numpy as np
+  time = np.empty(samples)
+  for start, stop in _chunks(samples):
+    conversions.append((_convertTime, (start, stop, time[start:stop], samples, 
+                         channelDict["timeScale"], channelDict["timeDelay"])))
+  return time
+
+def parseRigolWFM(f, strict=True, loadSamples=True, threads=None):
   """
   Parse a file object which has opened a Rigol WFM file in read-binary 
   mode (rb).
@@ -82,6 +314,16 @@ def parseRigolWFM(f, strict=True):
   Note, that trigger information might be per-channel specific (i.e. in 
   alternate trigger mode). In such cases, you have to use the trigger 
   information in the channel data.
+  
+  If loadSamples is False, only the header of the file is interpreted and
+  the channels do not contain any "samples". This is much faster if only 
+  the settings of the scope are of interest. Instead, every enabled channel
+  contains the "dataOffset" of its raw samples within the file.
+  
+  If threads is given, the samples are converted by this number of worker 
+  threads using numpy. Long records are split into chunks, so that even a 
+  single channel is converted by several threads. In this case, "volts", 
+  "time" and "byChannel" of the samples are numpy arrays instead of lists.
   """
   
   # # # #
@@ -89,113 +331,7 @@ def parseRigolWFM(f, strict=True):
   # interpreted later on.
   
 
-  chan_header  = (
-    ("scaleD",     "i", None),
-    
-    ("shiftD",     "h", None),
-    ("padding1",   "2s",  ("require", "==", b'\x00'*2)),
-    
-    ("probeAtt",   "f", ("require", ">", 0)),
-    ("invertD",    "B", ("require", "in", (0,1))),
-    ("written",    "B", ("require", "in", (0,1))),
-    ("invertM",    "B", ("require", "in", (0,1))),
-    ("padding2",   "1s",  ("require", "==", b'\x00'*1)),
-    ("scaleM",     "i", None),
-    ("shiftM",     "h", None)
-  )
-  
-  time_header  = (
-    ("scaleD",     "q", None),
-    ("delayD",     "q", None),
-    ("smpRate",    "f", ("require", ">=", 0)),
-    ("scaleM",     "q", None),
-    ("delayM",     "q", None)
-  )
-  
-  trigger_header  = (
-    ("mode",       "B", None),
-    ("source",     "B", None),
-    ("coupling",   "B", None),
-    ("sweep",      "B", None),
-    ("padding1",   "1s",  ("require", "==", b'\x00'*1)),
-    ("sens",       "f", None),
-    ("holdoff",    "f", None),
-    ("level",      "f", None),
-    ("direct",     "B", None),
-    ("pulseType",  "B", None),
-    ("padding2",   "2s",  ("require", "==", b'\x00'*2)),
-    ("PulseWidth", "f", None),
-    ("slopeType",  "B", None),
-    ("padding3",   "3s",  ("require", "==", b'\x00'*3)),
-    ("lower",      "f", None),
-    ("slopeWid",   "f", None),
-    ("videoPol",   "B", None),
-    ("videoSync",  "B", None),
-    ("videoStd",   "B", None)
-  )
-  
-  logic_analizer_channel = (
-    # Todo: Try to add logic analyzer
-    ("written",  "B", ("require", "in", (0,1))),
-    ("activeCh", "B", ("require", "in", range(16))),
-    ("enabledChannels", "H", None), # Each bit corresponds to one enabled channel
-    ("position", "16s", None),
-    ("group8to15size", "B", ("require", "in", [7,15])),
-    ("group0to7size", "B", ("require", "in", [7,15]))
-  )
-  
-  wfm_header = (
-    ("magic",    "H",   ("require", "==", 0xa5a5)),
-    ("padding1", "2s",  ("require", "==", b'\x00'*2)),
-    
-    ("unused1",  "4s",   ("expect", "==", b'\x00'*4)),
-    ("unused2",  "4s",   ("expect", "==", b'\x00'*4)),
-    ("unused3",  "4s",   ("expect", "==", b'\x00'*4)),
-    
-    ("adcMode",   "B",   ("expect", "in", (0, 1))),
-    ("padding2",  "3s",  ("require", "==", b'\x00'*3)),
-    
-    ("rollStop",  "I",  ("expect", "==", 0)),
-    ("unused4",  "4s",   ("expect", "==", b'\x00'*4)),
-    
-    ("points1",  "I",   None),
-    
-    ("activeCh", "B",   ("require", "in", range(1,6))),
-    ("padding3", "3s",  ("require", "==", b'\x00'*3)),
-    
-    ("channel1", "nested", chan_header),
-    ("padding4", "2s",  ("require", "==", b'\x00'*2)),
-    
-    ("channel2", "nested", chan_header),
-    
-    ("timeDelayed", "B",  None),
-    ("padding5",    "1s",  ("require", "==", b'\x00'*1)),
-    
-    ("time1",    "nested", time_header),
-    
-    ("channelLA", "nested", logic_analizer_channel),
-    
-    ("trigMode", "B",  None),      #FIXME: Add test
-    ("trigHdr1", "nested", trigger_header),
-    ("trigHdr2", "nested", trigger_header),
-    
-    ("fooG",     "9s", ("expect", "==", b'\x00'*9)),
-    ("points2",  "i", None),
-    
-    ("time2",    "nested", time_header)
-  )
-  
-  # There are two known versions of the WFM file format:
-  # 1. The presumably older version does not include the laSmpRate 
-  #    field.
-  # 2. The laSmpRate field is added between the time2 header and
-  #    the channel data.
-  
-  wfm_header_append_v2 = (
-    ("laSmpRate",  "f",  ("require", ">=", 0)),
-  )
-  
-  fileHdr = _parseFile(f, wfm_header, strict=strict)
+  fileHdr = _parseFile(f, _WFM_LAYOUT, strict=strict)
   
   # Add some simple access helpers for the repeating fields
   fileHdr["channels"] = (fileHdr["channel1"], fileHdr["channel2"])
@@ -233,7 +369,7 @@ def parseRigolWFM(f, strict=True):
   if bytesMissing == 0:
     pass
   elif bytesMissing == struct.calcsize("f"):
-    fileHdr_append_v2 = _parseFile(f, wfm_header_append_v2, strict=strict)
+    fileHdr_append_v2 = _parseFile(f, _WFM_LAYOUT_APPEND_V2, strict=strict)
     fileHdr.update(fileHdr_append_v2)
   else:
     raise FormatError("File length is not as expected: %i bytes remaining." % (bytesMissing,))
@@ -241,32 +377,53 @@ def parseRigolWFM(f, strict=True):
   #import pprint
   #pprint.pprint(fileHdr)
   
-  # Read in the sample data from the scope
+  # Find out how many samples are stored for every channel and where
   dataIdx = 0
+  dataOffset = f.tell()
   for channel in range(2):
     if fileHdr["channels"][channel]['written']:
-      #print("Channel %i written, reading it" % channel)
-      nBytes = fileHdr["points"][dataIdx] * struct.calcsize("B")
-    
-      sampleData = array.array('B')
-      sampleData.fromfile(f, nBytes)
-      fileHdr["channels"][channel]['data'] = sampleData
+      fileHdr["channels"][channel]['dataPoints'] = fileHdr["points"][dataIdx]
+      fileHdr["channels"][channel]['dataOffset'] = dataOffset
+      dataOffset += fileHdr["points"][dataIdx] * struct.calcsize("B")
       dataIdx = dataIdx + 1
   
   if fileHdr['channelLA']['written']:
-    nBytes = fileHdr["points"][0] * struct.calcsize("B")
-    sampleData = array.array('H')
-    sampleData.fromfile(f, nBytes)
-    if sys.byteorder == 'big':
-      sampleData.byteswap()
-      
-    fileHdr["channelLA"]['data'] = sampleData
+    fileHdr["channelLA"]['dataPoints'] = fileHdr["points"][0]
+    fileHdr["channelLA"]['dataOffset'] = dataOffset
+  
+  # Read in the sample data from the scope
+  if loadSamples:
+    for channel in range(2):
+      if fileHdr["channels"][channel]['written']:
+        #print("Channel %i written, reading it" % channel)
+        sampleData = array.array('B')
+        try:
+          sampleData.fromfile(f, fileHdr["channels"][channel]['dataPoints'])
+        except EOFError:
+          raise FormatError("File is truncated in the samples of channel %i" % (channel+1))
+        fileHdr["channels"][channel]['data'] = sampleData
+    
+    if fileHdr['channelLA']['written']:
+      sampleData = array.array('H')
+      try:
+        sampleData.fromfile(f, fileHdr["channelLA"]['dataPoints'])
+      except EOFError:
+        raise FormatError("File is truncated in the samples of the LA channel")
+      if sys.byteorder == 'big':
+        sampleData.byteswap()
+        
+      fileHdr["channelLA"]['data'] = sampleData
     
   
   # # # # # # # # # # # #
   # Interpreter all the results to mean something useful.
   scopeData = dict()
   
+  # Sample conversions which are run by the worker threads at the end
+  conversions = []
+  if threads and loadSamples:
+    import numpy as np
+  
   # Other general information
   scopeData["activeChannel"] = ("CH1", "CH2", "REF", "MATH", "LA")[fileHdr["activeCh"] - 1]
   
@@ -275,40 +432,8 @@ def parseRigolWFM(f, strict=True):
   scopeData["alternateTrigger"] = (fileHdr["trigMode"] == 4)
   assert scopeData["alternateTrigger"] or fileHdr["trigMode"] == fileHdr["trigHdr1"]['mode'], "Not in alternate mode, but mode headers don't match"
   
-  def parseTriggerHdr(trigHdr):
-    trgDict = dict()
-    trgDict["mode"] = ("Edge", "Pulse", "Slope", "Video", "Alternate")[trigHdr["mode"]]
-    trgDict["source"] = ("CH1", "CH2", "EXT", "AC Line")[trigHdr["source"]]
-    trgDict["coupling"] = ("DC", "LF Reject", "HF Reject", "AC")[trigHdr["coupling"]]
-    trgDict["sweep"] = ("Auto", "Normal", "Single")[trigHdr["sweep"]]
-    trgDict["holdoff"] = trigHdr["holdoff"]     # Seconds
-    trgDict["sensitivity"] = trigHdr["sens"]    # Volts
-    trgDict["level"] = trigHdr["level"]         # Volts
-    
-    
-    if trgDict["mode"] in ("Edge",):
-      trgDict["edgeDirection"] = ("RISE", "FALL", "BOTH")[trigHdr["direct"]]
-    
-    if trgDict["mode"] in ("Pulse",):
-      trgDict["pulseType"] = ("POS >", "POS <", "POS =", "NEG >", "NEG <", "NEG =")[trigHdr["pulseType"]]
-      trgDict["pulseWidth"] = trigHdr["PulseWidth"]
-      
-    if trgDict["mode"] in ("Slope",):
-      trgDict["slopeType"] = ("RISE >", "RISE <", "RISE =", "FALL >", "FALL <", "FALL =")[trigHdr["slopeType"]]
-      trgDict["slopeLowerLevel"] = trigHdr["lower"]  # Volts
-      trgDict["slopeWidth"] = trigHdr["slopeWid"]  # Seconds FIXME: What about slopeWid?
-      trgDict["slope"] = (trgDict["level"] -  trgDict["slopeLowerLevel"]) / trgDict["slopeWidth"] if trgDict["slopeWidth"] else float('inf')      # V/s
-    
-    if trgDict["mode"] in ("Video",):
-      trgDict["videoPol"] = ("POS", "NEG")[trigHdr["videoPol"]]
-      trgDict["videoSync"] = ("All Lines", "Line Num", "Odd Field", "Even Field")[trigHdr["videoSync"]]
-      trgDict["videoStd"] = ("NTSC", "PAL/SECAM")[trigHdr["videoStd"]]
-    
-    return trgDict
-  
-
   if not scopeData["alternateTrigger"]:
-    scopeData["triggers"] = parseTriggerHdr(fileHdr["trigHdr1"])
+    scopeData["triggers"] = _parseTriggerHdr(fileHdr["trigHdr1"])
   
   scopeData["channel"] = dict()
   for channel in range(2):
@@ -319,7 +444,7 @@ def parseRigolWFM(f, strict=True):
     
     if channelDict["enabled"]:
       if scopeData["alternateTrigger"]:
-        channelDict["triggers"] = parseTriggerHdr(fileHdr["triggers"][channel])
+        channelDict["triggers"] = _parseTriggerHdr(fileHdr["triggers"][channel])
         # The source field is not valid in alternate trigger mode
         channelDict["triggers"]["source"] = channelDict["channelName"]
       else:
@@ -337,17 +462,27 @@ def parseRigolWFM(f, strict=True):
         sign = 1
       
       # Calculate the sample data
+      if loadSamples:
+        # In rolling mode, not all samples are valid otherwise use all samples
+        if fileHdr["rollStop"] == 0:
+          channelDict["samples"] = {'raw' : fileHdr["channels"][channel]['data']}
+        else:
+          channelDict["samples"] = {'raw' : fileHdr["channels"][channel]['data'][:fileHdr["rollStop"]]}
+          
+        if threads:
+          raw = np.frombuffer(channelDict["samples"]["raw"], dtype=np.uint8)
+          volts = np.empty(len(raw))
+          for start, stop in _chunks(len(raw)):
+            conversions.append((_convertVolts, (raw[start:stop], volts[start:stop], 
+                                 channelDict["scale"], channelDict["shift"], sign)))
+          channelDict["samples"]["volts"] = volts
+        else:
+          channelDict["samples"]["volts"] =  [((125-x)/25.*channelDict["scale"] - channelDict["shift"])*sign for x in channelDict["samples"]["raw"]]
       
-      # In rolling mode, not all samples are valid otherwise use all samples
-      if fileHdr["rollStop"] == 0:
-        channelDict["samples"] = {'raw' : fileHdr["channels"][channel]['data']}
-      else:
-        channelDict["samples"] = {'raw' : fileHdr["channels"][channel]['data'][:fileHdr["rollStop"]]}
-        
-      channelDict["samples"]["volts"] =  [((125-x)/25.*channelDict["scale"] - channelDict["shift"])*sign for x in channelDict["samples"]["raw"]]
-      
-      samples = len(channelDict["samples"]["raw"])
+      samples = _validSamples(fileHdr, fileHdr["channels"][channel])
       channelDict["nsamples"] = samples
+      if not loadSamples:
+        channelDict["dataOffset"] = fileHdr["channels"][channel]['dataOffset']
       
       if not scopeData["alternateTrigger"]:
         timebase = fileHdr["time1"]
@@ -359,9 +494,8 @@ def parseRigolWFM(f, strict=True):
       channelDict["timeDelay"] = 1e-12 * timebase['delayM']
       channelDict["timeDiv"] = timebase['scaleM'] * 1e-12 
       
-      channelDict["samples"]["time"] = [
-        (t - samples/2) * channelDict["timeScale"] + channelDict["timeDelay"]
-                          for t in range(samples)]
+      if loadSamples:
+        channelDict["samples"]["time"] = _timeSamples(channelDict, samples, threads, conversions)
       
     # Save channel data to the overall scope data
     scopeData["channel"][channel+1] = channelDict
@@ -381,22 +515,24 @@ def parseRigolWFM(f, strict=True):
     else:
       channelDict["samplerate"] = timebase["smpRate"]
     
-    # In rolling mode, not all samples are valid otherwise use all samples
-    if fileHdr["rollStop"] == 0:
-      channelDict["samples"] = {'raw' : fileHdr["channelLA"]['data']}
-    else:
-      channelDict["samples"] = {'raw' : fileHdr["channelLA"]['data'][:fileHdr["rollStop"]]}
+    if loadSamples:
+      # In rolling mode, not all samples are valid otherwise use all samples
+      if fileHdr["rollStop"] == 0:
+        channelDict["samples"] = {'raw' : fileHdr["channelLA"]['data']}
+      else:
+        channelDict["samples"] = {'raw' : fileHdr["channelLA"]['data'][:fileHdr["rollStop"]]}
     
-    samples = len(channelDict["samples"]["raw"])
+    samples = _validSamples(fileHdr, fileHdr["channelLA"])
     channelDict["nsamples"] = samples
+    if not loadSamples:
+      channelDict["dataOffset"] = fileHdr["channelLA"]['dataOffset']
         
     channelDict["timeScale"] = 1./channelDict["samplerate"]
     channelDict["timeDelay"] = 1e-12 * timebase['delayM']
     channelDict["timeDiv"] = timebase['scaleM'] * 1e-12 
     
-    channelDict["samples"]["time"] = [
-      (t - samples/2) * channelDict["timeScale"] + channelDict["timeDelay"]
-                        for t in range(samples)]
+    if loadSamples:
+      channelDict["samples"]["time"] = _timeSamples(channelDict, samples, threads, conversions)
     
     channelDict["activeChannel"] = fileHdr["channelLA"]['activeCh']
     channelDict["enabledChannelsMask"] = [bool(fileHdr["channelLA"]['enabledChannels'] & (1<<p)) for p in range(16)]
@@ -409,9 +545,18 @@ def parseRigolWFM(f, strict=True):
         channelDict["enabledChannels"].append(i)
     
     # Separate data into channels
-    channelDict["samples"]['byChannel'] = {
-      c : [(sample & 1<<c)>0 for sample in channelDict["samples"]['raw']] for c in channelDict["enabledChannels"]
-      }
+    if loadSamples and threads:
+      raw = np.frombuffer(channelDict["samples"]['raw'], dtype=np.uint16)
+      channelDict["samples"]['byChannel'] = dict()
+      for c in channelDict["enabledChannels"]:
+        bits = np.empty(len(raw), dtype=bool)
+        for start, stop in _chunks(len(raw)):
+          conversions.append((_convertBit, (raw[start:stop], bits[start:stop], c)))
+        channelDict["samples"]['byChannel'][c] = bits
+    elif loadSamples:
+      channelDict["samples"]['byChannel'] = {
+        c : [(sample & 1<<c)>0 for sample in channelDict["samples"]['raw']] for c in channelDict["enabledChannels"]
+        }
     
     channelDict["waveSizeGroup1"] = {7:'big', 15:'small'}[fileHdr["channelLA"]['group0to7size']]
     channelDict["waveSizeGroup2"] = {7:'big', 15:'small'}[fileHdr["channelLA"]['group8to15size']]
@@ -421,12 +566,66 @@ def parseRigolWFM(f, strict=True):
   # Save channel data to the overall scope data
   scopeData["channel"]['LA'] = channelDict
   
+  if conversions:
+    from concurrent.futures import ThreadPoolExecutor
+    
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+      # Fetch all results, so that exceptions of the workers are raised here
+      list(pool.map(lambda conversion: conversion[0](*conversion[1]), conversions))
+  
   #pprint.pprint(scopeData)
   return scopeData
   
   
   
   
+_HEADER_DSC = (
+  ('activeChannel'     , ("Cur. selected channel", "%s")),
+  ('alternateTrigger'  , ("Alternate trigger", "%s")),
+  )
+
+_CHANNEL_DSC = (
+  ('enabled'           , ("Enabled", "%s")),
+  ('probeAttenuation'  , ("Probe attenuation", "%0.1f")),
+  ('scale'             , ("Y grid scale", "%0.3e V/div")),
+  ('shift'             , ("Y shift", "%0.3e V")),
+  ('inverted'          , ("Y inverted", "%s")),
+  ('timeDiv'           , ("Time grid scale", "%0.3e s/div")),
+  ('samplerate'        , ("Samplerate", "%0.3e Samples/s")),
+  ('timeDelay'         , ("Time delay", "%0.3e s")),
+  ('nsamples'          , ("No. of recorded samples", "%i")),
+
+  ('activeChannel'     , ("Active channel", "%i")),
+  ('enabledChannels'   , ("Enabled channels", "%s")),
+
+  ('waveSizeGroup1'    , ("Size group 1 (D0-D7)", "%s")),
+  ('waveSizeGroup1'    , ("Size group 2 (D0-D7)", "%s")),
+  )
+
+_TRIGGER_DSC = (
+  ('mode'              , ("Mode", "%s")),
+  ('source'            , ("Source", "%s")),
+  ('coupling'          , ("Coupling", "%s")),
+  ('sweep'             , ("Sweep", "%s")),
+  ('holdoff'           , ("Holdoff", "%0.3e s")),
+  ('sensitivity'       , ("Sensitivity", "%0.3e div")),
+  ('level'             , ("Level", "%0.3e V")),
+
+  ('edgeDirection'     , ("Edge direction", "%s")),
+
+  ('pulseType'         , ("Pulse type", "%s")),
+  ('pulseWidth'        , ("Pulse type","%0.3e s")),
+
+  ('slopeType'         , ("Slope type", "%s")),
+  ('slopeLowerLevel'   , ("Slope lower level","%0.3e V")),
+  ('slopeWidth'        , ("Slope width","%0.3e s")),
+  ('slope'             , ("Slope slope","%0.3e V/s")),
+
+  ('videoPol'          , ("Video polarity", "%s")),
+  ('videoSync'         , ("Video sync", "%s")),
+  ('videoStd'          , ("Video standard", "%s")),
+  )
+
 def describeScopeData(scopeData):
   """
   Returns a human-readable string representation of a scope data dictionary.
@@ -441,70 +640,23 @@ def describeScopeData(scopeData):
   def header(header_name, sep = '='):
     return "\n%s\n%s\n" % (header_name, sep*len(header_name))
   
-  headerDsc = (
-    ('activeChannel'     , ("Cur. selected channel", "%s")),
-    ('alternateTrigger'  , ("Alternate trigger", "%s")),
-    )
-  
-  channelDsc = (
-    ('enabled'           , ("Enabled", "%s")),
-    ('probeAttenuation'  , ("Probe attenuation", "%0.1f")),
-    ('scale'             , ("Y grid scale", "%0.3e V/div")),
-    ('shift'             , ("Y shift", "%0.3e V")),
-    ('inverted'          , ("Y inverted", "%s")),
-    ('timeDiv'           , ("Time grid scale", "%0.3e s/div")),
-    ('samplerate'        , ("Samplerate", "%0.3e Samples/s")),
-    ('timeDelay'         , ("Time delay", "%0.3e s")),
-    ('nsamples'          , ("No. of recorded samples", "%i")),
-    
-    ('activeChannel'     , ("Active channel", "%i")),
-    ('enabledChannels'   , ("Enabled channels", "%s")),
-    
-    ('waveSizeGroup1'    , ("Size group 1 (D0-D7)", "%s")),
-    ('waveSizeGroup1'    , ("Size group 2 (D0-D7)", "%s")),
-    )
-  
-  triggerDsc = (
-    ('mode'              , ("Mode", "%s")),
-    ('source'            , ("Source", "%s")),
-    ('coupling'          , ("Coupling", "%s")),
-    ('sweep'             , ("Sweep", "%s")),
-    ('holdoff'           , ("Holdoff", "%0.3e s")),
-    ('sensitivity'       , ("Sensitivity", "%0.3e div")),
-    ('level'             , ("Level", "%0.3e V")),
-    
-    ('edgeDirection'     , ("Edge direction", "%s")),
-    
-    ('pulseType'         , ("Pulse type", "%s")),
-    ('pulseWidth'        , ("Pulse type","%0.3e s")),
-    
-    ('slopeType'         , ("Slope type", "%s")),
-    ('slopeLowerLevel'   , ("Slope lower level","%0.3e V")),
-    ('slopeWidth'        , ("Slope width","%0.3e s")),
-    ('slope'             , ("Slope slope","%0.3e V/s")),
-    
-    ('videoPol'          , ("Video polarity", "%s")),
-    ('videoSync'         , ("Video sync", "%s")),
-    ('videoStd'          , ("Video standard", "%s")),
-    )
-  
   tmp = ""
   
   tmp = tmp + header("General")
-  tmp = tmp + describeDict(scopeData, headerDsc, ljust=25)
+  tmp = tmp + describeDict(scopeData, _HEADER_DSC, ljust=25)
   
   for i in [1, 2, 'LA']:
     channelDict = scopeData["channel"][i]
     
     tmp = tmp + header("Channel %s" % channelDict["channelName"])
-    tmp = tmp + describeDict(channelDict, channelDsc, ljust=25)
+    tmp = tmp + describeDict(channelDict, _CHANNEL_DSC, ljust=25)
     
     if scopeData["alternateTrigger"]:
       if "triggers" in channelDict:
         tmp = tmp + header("Channel %s Trigger" % channelDict["channelName"], sep='-')
-        tmp = tmp + describeDict(channelDict["triggers"], triggerDsc, ljust=25)
+        tmp = tmp + describeDict(channelDict["triggers"], _TRIGGER_DSC, ljust=25)
     else:
       tmp = tmp + header("Trigger")
-      tmp = tmp + describeDict(scopeData["triggers"], triggerDsc, ljust=25)
+      tmp = tmp + describeDict(scopeData["triggers"], _TRIGGER_DSC, ljust=25)
   
   return tmp
\ No newline at end of file
@@ -0,0 +1,363 @@
+from __future__ import print_function, division
+
+import json
+import os
+import struct
+import zlib
+
+import numpy as np
+
+import wfm
+
+# Copyright (c) 2013, Matthias Blaicher
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# An archive stores many WFM files in a single file:
+#
+#   magic                 8 bytes
+#   blocks                zlib compressed, see below
+#   index                 zlib compressed JSON
+#   trailer               offset and length of the index, magic
+#
+# For every capture, the index holds its interpreted header (as returned by
+# wfm.parseRigolWFM without samples) and where its blocks are stored. The
+# first block holds the file header up to the samples. The samples of every
+# channel are split into chunks of chunkSize samples, each stored in its own
+# block, so that a range of samples can be read without decompressing
+# anything else. Analog samples are delta coded, LA samples, which change
+# rarely, are run-length coded. CRC32 checksums of the samples and of the
+# whole file allow to verify the round-trip.
+
+MAGIC = b"RWFMARC1"
+VERSION = 1
+
+# Number of samples in every compressed block
+CHUNK_SIZE = 1 << 16
+
+_TRAILER = struct.Struct("<QQ8s")
+_RUN_COUNT = struct.Struct("<I")
+
+_CHANNELS = (1, 2, 'LA')
+
+
+class ArchiveError(Exception):
+  pass
+
+
+def _encodeDelta(samples):
+  """
+  Delta coding of 8-bit ADC samples. The differences wrap around.
+  """
+  return np.diff(samples, prepend=np.uint8(0)).tobytes()
+
+def _decodeDelta(data):
+  return np.cumsum(np.frombuffer(data, dtype=np.uint8), dtype=np.uint8)
+
+def _encodeRunLength(samples):
+  """
+  Run-length coding of 16-bit LA samples, stored as the number of runs, the
+  value and the length of every run.
+  """
+  starts = np.flatnonzero(np.diff(samples, prepend=~samples[:1]))
+  lengths = np.diff(np.append(starts, len(samples)))
+  return (_RUN_COUNT.pack(len(starts)) + samples[starts].astype('<u2').tobytes() +
+            lengths.astype('<u4').tobytes())
+
+def _decodeRunLength(data):
+  count, = _RUN_COUNT.unpack_from(data)
+  values = np.frombuffer(data, dtype='<u2', count=count, offset=_RUN_COUNT.size)
+  lengths = np.frombuffer(data, dtype='<u4', count=count, offset=_RUN_COUNT.size + 2*count)
+  return np.repeat(values, lengths)
+
+# dtype, encoder and decoder of the samples of every channel
+_CODINGS = {
+  'delta'     : ('u1',  _encodeDelta,     _decodeDelta),
+  'runlength' : ('<u2', _encodeRunLength, _decodeRunLength),
+}
+
+def isSafeName(name):
+  """
+  Check that a capture name can be used as file name within a directory,
+  i.e. that it is neither empty nor contains a path.
+  """
+  return (name not in ("", ".", "..") and "/" not in name and "\\" not in name and
+            "\0" not in name and not os.path.isabs(name))
+
+def _channelKey(channel):
+  """
+  JSON only knows string keys, so the channels 1 and 2 are stored as "1" and
+  "2". This converts them back.
+  """
+  return int(channel) if channel in ("1", "2") else channel
+
+
+class ArchiveWriter(object):
+  """
+  Writes WFM files into a new archive. The file object f has to be opened in
+  write-binary mode (wb). The archive is only complete after close() has
+  been called. When used as context manager, the archive is closed even if
+  an exception is raised, so that it holds all files added until then.
+  """
+
+  def __init__(self, f, chunkSize=CHUNK_SIZE, level=6):
+    self.f = f
+    self.chunkSize = chunkSize
+    self.level = level
+    self.captures = []
+
+    self.f.write(MAGIC)
+
+  def _writeBlock(self, data):
+    compressed = zlib.compress(data, self.level)
+    offset = self.f.tell()
+    self.f.write(compressed)
+    return [offset, len(compressed)]
+
+  def add(self, filename, name=None, strict=True):
+    """
+    Add a WFM file to the archive under name, which defaults to the file
+    name. Returns the index entry of the capture.
+    """
+    if name is None:
+      name = os.path.basename(filename)
+    if not isSafeName(name):
+      raise ArchiveError("Capture name %s must not contain a path" % name)
+    if name in [capture["name"] for capture in self.captures]:
+      raise ArchiveError("Archive already contains a capture named %s" % name)
+
+    with open(filename, 'rb') as f:
+      scopeData = wfm.parseRigolWFM(f, strict, loadSamples=False)
+
+      f.seek(0, os.SEEK_END)
+      fileSize = f.tell()
+
+      # The samples of all channels follow each other up to the end of the
+      # file. Everything in front of them is the header.
+      enabled = sorted([c for c in _CHANNELS if scopeData["channel"][c]["enabled"]],
+                         key=lambda c: scopeData["channel"][c]["dataOffset"])
+      offsets = [scopeData["channel"][c]["dataOffset"] for c in enabled] + [fileSize]
+
+      f.seek(0)
+      header = f.read(offsets[0])
+      fileCrc = zlib.crc32(header)
+
+      capture = {
+        "name"      : name,
+        "size"      : fileSize,
+        "header"    : self._writeBlock(header),
+        "channels"  : dict(),
+      }
+
+      for channel, start, stop in zip(enabled, offsets, offsets[1:]):
+        coding = 'runlength' if channel == 'LA' else 'delta'
+        dtype, encode, decode = _CODINGS[coding]
+        itemsize = np.dtype(dtype).itemsize
+
+        channelIdx = {
+          "coding"    : coding,
+          "points"    : (stop - start) // itemsize,
+          "chunks"    : [],
+        }
+
+        crc = 0
+        f.seek(start)
+        for chunkStart in range(start, stop, self.chunkSize * itemsize):
+          data = f.read(min(self.chunkSize * itemsize, stop - chunkStart))
+          crc = zlib.crc32(data, crc)
+          fileCrc = zlib.crc32(data, fileCrc)
+          channelIdx["chunks"].append(self._writeBlock(encode(np.frombuffer(data, dtype=dtype))))
+
+        channelIdx["crc32"] = crc & 0xffffffff
+        capture["channels"][str(channel)] = channelIdx
+
+        # The offset is only valid within the original file
+        del scopeData["channel"][channel]["dataOffset"]
+
+    capture["crc32"] = fileCrc & 0xffffffff
+    capture["scopeData"] = scopeData
+
+    self.captures.append(capture)
+    return capture
+
+  def close(self):
+    """
+    Write the index and the trailer of the archive.
+    """
+    index = {
+      "version"   : VERSION,
+      "chunkSize" : self.chunkSize,
+      "captures"  : self.captures,
+    }
+    offset, length = self._writeBlock(json.dumps(index).encode('utf-8'))
+    self.f.write(_TRAILER.pack(offset, length, MAGIC))
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, excType, excValue, traceback):
+    self.close()
+
+
+class ArchiveReader(object):
+  """
+  Reads captures from an archive. The file object f has to be opened in
+  read-binary mode (rb). Only the blocks which are needed are read and
+  decompressed.
+  """
+
+  def __init__(self, f):
+    self.f = f
+
+    if self.f.read(len(MAGIC)) != MAGIC:
+      raise ArchiveError("Not a WFM archive")
+
+    self.f.seek(0, os.SEEK_END)
+    if self.f.tell() < len(MAGIC) + _TRAILER.size:
+      raise ArchiveError("Archive is incomplete, the trailer is missing")
+
+    self.f.seek(-_TRAILER.size, os.SEEK_END)
+    offset, length, magic = _TRAILER.unpack(self.f.read(_TRAILER.size))
+    if magic != MAGIC:
+      raise ArchiveError("Archive is incomplete, the trailer is missing")
+
+    try:
+      index = json.loads(self._readBlock([offset, length]).decode('utf-8'))
+    except ValueError:
+      raise ArchiveError("Index of the archive is corrupted")
+    if index["version"] != VERSION:
+      raise ArchiveError("Unknown archive version %s" % index["version"])
+
+    self.chunkSize = index["chunkSize"]
+    self.captures = index["captures"]
+
+    for capture in self.captures:
+      channels = capture["scopeData"]["channel"]
+      capture["scopeData"]["channel"] = dict((_channelKey(c), channels[c]) for c in channels)
+      capture["channels"] = dict((_channelKey(c), capture["channels"][c]) for c in capture["channels"])
+
+  def _readBlock(self, block):
+    offset, length = block
+    self.f.seek(offset)
+    try:
+      return zlib.decompress(self.f.read(length))
+    except zlib.error as e:
+      raise ArchiveError("Archive is corrupted at offset %i: %s" % (offset, e))
+
+  def names(self):
+    return [capture["name"] for capture in self.captures]
+
+  def find(self, name):
+    """
+    Returns the number of the capture with the given name.
+    """
+    for i, capture in enumerate(self.captures):
+      if capture["name"] == name:
+        return i
+    raise ArchiveError("Archive does not contain a capture named %s" % name)
+
+  def scopeData(self, capture):
+    """
+    Returns the scope data of a capture, like wfm.parseRigolWFM without
+    samples.
+    """
+    return self.captures[capture]["scopeData"]
+
+  def _readPoints(self, capture, channel, start, stop):
+    """
+    Returns the stored points start to stop of a channel, including those
+    which are not valid in rolling mode.
+    """
+    channelIdx = self.captures[capture]["channels"].get(channel)
+    if channelIdx is None:
+      raise ArchiveError("Channel %s is not enabled in capture %i" % (channel, capture))
+
+    stop = min(stop, channelIdx["points"])
+    start = max(0, min(start, stop))
+
+    dtype, encode, decode = _CODINGS[channelIdx["coding"]]
+
+    firstChunk = start // self.chunkSize
+    lastChunk = (stop - 1) // self.chunkSize + 1
+    chunks = [decode(self._readBlock(block)) for block in channelIdx["chunks"][firstChunk:lastChunk]]
+    if not chunks:
+      return np.empty(0, dtype=dtype)
+
+    samples = np.concatenate(chunks)
+    offset = firstChunk * self.chunkSize
+    return samples[start - offset:stop - offset]
+
+  def readSamples(self, capture, channel, start=0, stop=None):
+    """
+    Returns the raw samples start to stop of a channel (1, 2 or 'LA') of a
+    capture as numpy array. By default, all valid samples are returned. In
+    rolling mode, the samples behind the valid ones are never returned.
+    """
+    if channel not in self.captures[capture]["channels"]:
+      raise ArchiveError("Channel %s is not enabled in capture %i" % (channel, capture))
+
+    nsamples = self.captures[capture]["scopeData"]["channel"][channel]["nsamples"]
+    if stop is None:
+      stop = nsamples
+    return self._readPoints(capture, channel, start, min(stop, nsamples))
+
+  def readFile(self, capture):
+    """
+    Returns the contents of the original WFM file of a capture. An
+    ArchiveError is raised if they do not match the checksum of the file.
+    """
+    captureIdx = self.captures[capture]
+    data = [self._readBlock(captureIdx["header"])]
+
+    for channel in sorted(captureIdx["channels"], key=lambda c: _CHANNELS.index(c)):
+      channelIdx = captureIdx["channels"][channel]
+      dtype = _CODINGS[channelIdx["coding"]][0]
+      data.append(self._readPoints(capture, channel, 0, channelIdx["points"]).astype(dtype).tobytes())
+
+    data = b"".join(data)
+    if len(data) != captureIdx["size"] or zlib.crc32(data) & 0xffffffff != captureIdx["crc32"]:
+      raise ArchiveError("Capture %s is corrupted" % captureIdx["name"])
+
+    return data
+
+  def verify(self, capture):
+    """
+    Check that the samples of every channel and the original file of a
+    capture are restored exactly.
+    """
+    captureIdx = self.captures[capture]
+
+    for channel, channelIdx in captureIdx["channels"].items():
+      dtype = _CODINGS[channelIdx["coding"]][0]
+      try:
+        samples = self._readPoints(capture, channel, 0, channelIdx["points"]).astype(dtype).tobytes()
+      except ArchiveError:
+        return False
+      if zlib.crc32(samples) & 0xffffffff != channelIdx["crc32"]:
+        return False
+
+    try:
+      self.readFile(capture)
+    except ArchiveError:
+      return False
+
+    return True
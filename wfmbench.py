@@ -0,0 +1,92 @@
+#! /usr/bin/env python
+
+from __future__ import print_function, division
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+# Copyright (c) 2013, Matthias Blaicher
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+WFMUTIL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "wfmutil.py")
+
+# The first line printed by the info action after a file has been parsed
+FIRST_OUTPUT = b"General"
+
+def timeToFirstOutput(command):
+  """
+  Run command and return the seconds until the output of the first parsed
+  file appears and until it has finished.
+  
+  The command has to run python unbuffered, otherwise the output would only
+  arrive once the buffer is full or the process exits.
+  """
+  start = time.time()
+  process = subprocess.Popen(command, stdout=subprocess.PIPE)
+  for line in iter(process.stdout.readline, b""):
+    if line.strip() == FIRST_OUTPUT:
+      break
+  first = time.time() - start
+  process.stdout.read()
+  process.wait()
+  total = time.time() - start
+
+  if process.returncode != 0:
+    raise RuntimeError("%s failed with exit code %i" % (" ".join(command), process.returncode))
+
+  return first, total
+
+def median(values):
+  values = sorted(values)
+  return values[len(values)//2]
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Startup benchmark of "wfmutil.py info"')
+  parser.add_argument('infile', help="WFM file used for the benchmark")
+  parser.add_argument('--repeat', type=int, default=20, help="Number of process invocations")
+  parser.add_argument('--forgiving', action='store_true', help="Pass --forgiving to wfmutil.py")
+
+  args = parser.parse_args()
+
+  command = [sys.executable, "-u", WFMUTIL, "info"]
+  if args.forgiving:
+    command.append("--forgiving")
+
+  # One process per file, as done by shell pipelines
+  timings = [timeToFirstOutput(command + [args.infile]) for i in range(args.repeat)]
+  firsts = [first for first, total in timings]
+  totals = [total for first, total in timings]
+
+  print("One process per file (%i runs)" % args.repeat)
+  print("  Time to first output    : min %0.1f ms, median %0.1f ms" % (min(firsts)*1e3, median(firsts)*1e3))
+  print("  Time to completion      : min %0.1f ms, median %0.1f ms" % (min(totals)*1e3, median(totals)*1e3))
+
+  # All files handled by a single process
+  first, total = timeToFirstOutput(command + [args.infile]*args.repeat)
+
+  print("One process for all files (%i files)" % args.repeat)
+  print("  Time to first output    : %0.1f ms" % (first*1e3))
+  print("  Time per file           : %0.1f ms" % (total/args.repeat*1e3))
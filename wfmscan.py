@@ -0,0 +1,489 @@
+from __future__ import print_function, division
+
+import collections
+import copy
+
+import numpy as np
+
+import wfm
+
+# Copyright (c) 2013, Matthias Blaicher
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Number of samples which are read and scanned at once
+CHUNK_SIZE = 1 << 20
+
+# Default number of hits which are recorded per event and file
+MAX_HITS = 10000
+
+PULSE_TYPES = ("POS >", "POS <", "POS =", "NEG >", "NEG <", "NEG =")
+
+
+def _voltsToThreshold(channelDict, volts):
+  """
+  Translate a voltage of an analog channel into an ADC code.
+
+  This is the inverse of the conversion done by wfm.parseRigolWFM. As the
+  voltage usually falls with rising ADC codes, the direction is returned
+  as well.
+  """
+  sign = -1 if channelDict["inverted"] else 1
+  code = 125 - 25. * (volts*sign + channelDict["shift"]) / channelDict["scale"]
+  descending = sign * channelDict["scale"] > 0
+  return code, descending
+
+def _above(chunk, threshold):
+  """
+  Returns a mask of the raw samples with a voltage above the threshold.
+  """
+  code, descending = threshold
+  return chunk < code if descending else chunk > code
+
+def _below(chunk, threshold):
+  """
+  Returns a mask of the raw samples with a voltage below the threshold.
+  """
+  code, descending = threshold
+  return chunk > code if descending else chunk < code
+
+
+class _Event(object):
+  """
+  Base class of all events.
+
+  For every scanned channel, a copy of the event is started. It is then fed
+  with consecutive chunks of raw samples and returns the sample indices of
+  its hits.
+  """
+  source = None
+
+  def _start(self, channelDict):
+    raise NotImplementedError
+
+  def _feed(self, chunk, offset):
+    raise NotImplementedError
+
+class _TransitionEvent(_Event):
+  """
+  Hits whenever the mask of the samples changes to True (rising) and/or to
+  False (falling).
+  """
+  rising = True
+  falling = False
+
+  def _mask(self, chunk):
+    raise NotImplementedError
+
+  def _start(self, channelDict):
+    self._prev = None
+
+  def _feed(self, chunk, offset):
+    mask = self._mask(chunk).view(np.int8)
+
+    # The first sample of a record is no transition
+    prev = mask[0] if self._prev is None else self._prev
+    self._prev = mask[-1]
+
+    diff = np.diff(mask, prepend=prev)
+    if self.rising and self.falling:
+      hits = np.flatnonzero(diff)
+    elif self.rising:
+      hits = np.flatnonzero(diff > 0)
+    else:
+      hits = np.flatnonzero(diff < 0)
+
+    return hits + offset
+
+class _RunEvent(_Event):
+  """
+  Looks at runs of consecutive samples for which the mask is True, i.e.
+  pulses. The samples marked by _flags are counted for every run. Hits are
+  reported at the start of every run which meets _condition.
+
+  Runs which are cut off by the start or end of the record are ignored, as
+  they can not be measured.
+  """
+
+  def _mask(self, chunk):
+    raise NotImplementedError
+
+  def _flags(self, chunk):
+    return None
+
+  def _condition(self, lengths, flags):
+    raise NotImplementedError
+
+  def _start(self, channelDict):
+    self._prev = None
+    self._runStart = None
+    self._runFlags = 0
+    self._timeScale = channelDict["timeScale"]
+
+  def _feed(self, chunk, offset):
+    mask = self._mask(chunk).view(np.int8)
+
+    if self._prev is None:
+      # A run at the start of the record has been cut off
+      self._prev = mask[0]
+      self._runStart = None
+
+    diff = np.diff(mask, prepend=self._prev)
+    starts = np.flatnonzero(diff > 0)
+    ends = np.flatnonzero(diff < 0)
+
+    flags = self._flags(chunk)
+    cumFlags = np.zeros(len(chunk) + 1, dtype=np.int64)
+    if flags is not None:
+      np.cumsum(flags, out=cumFlags[1:])
+
+    hits = []
+
+    # Finish the run which is still open from the previous chunk
+    if self._prev:
+      if len(ends) == 0:
+        self._runFlags += cumFlags[-1]
+        return np.empty(0, dtype=np.int64)
+
+      if self._runStart is not None:
+        length = offset + ends[0] - self._runStart
+        runFlags = self._runFlags + cumFlags[ends[0]]
+        if self._condition(np.array([length]), np.array([runFlags]))[0]:
+          hits.append(np.array([self._runStart]))
+      ends = ends[1:]
+
+    # All runs which are completely within this chunk
+    runStarts = starts[:len(ends)]
+    met = self._condition(ends - runStarts, cumFlags[ends] - cumFlags[runStarts])
+    hits.append(runStarts[met] + offset)
+
+    # Remember the run which is still open at the end of this chunk
+    if len(starts) > len(ends):
+      self._runStart = offset + starts[-1]
+      self._runFlags = cumFlags[-1] - cumFlags[starts[-1]]
+    self._prev = mask[-1]
+
+    return np.concatenate(hits)
+
+
+class Edge(_TransitionEvent):
+  """
+  Hits when the voltage of an analog channel (1 or 2) crosses level. The
+  direction is one of "RISE", "FALL" or "BOTH", like for the edge trigger.
+  """
+
+  def __init__(self, source, level, direction="RISE"):
+    if direction not in ("RISE", "FALL", "BOTH"):
+      raise ValueError("Unknown edge direction %s" % direction)
+
+    self.source = source
+    self.level = level
+    self.direction = direction
+    self.rising = direction in ("RISE", "BOTH")
+    self.falling = direction in ("FALL", "BOTH")
+
+  def _start(self, channelDict):
+    _TransitionEvent._start(self, channelDict)
+    self._threshold = _voltsToThreshold(channelDict, self.level)
+
+  def _mask(self, chunk):
+    return _above(chunk, self._threshold)
+
+class Window(_TransitionEvent):
+  """
+  Hits when the voltage of an analog channel (1 or 2) leaves the window
+  between low and high.
+  """
+
+  def __init__(self, source, low, high):
+    if not low < high:
+      raise ValueError("Lower level of the window has to be below the upper level")
+
+    self.source = source
+    self.low = low
+    self.high = high
+
+  def _start(self, channelDict):
+    _TransitionEvent._start(self, channelDict)
+    self._low = _voltsToThreshold(channelDict, self.low)
+    self._high = _voltsToThreshold(channelDict, self.high)
+
+  def _mask(self, chunk):
+    return _above(chunk, self._high) | _below(chunk, self._low)
+
+class Runt(_RunEvent):
+  """
+  Hits at the start of runt pulses of an analog channel (1 or 2). A positive
+  ("POS") runt rises above low and falls below it again without reaching
+  high. A negative ("NEG") runt falls below high and rises above it again
+  without reaching low.
+  """
+
+  def __init__(self, source, low, high, polarity="POS"):
+    if not low < high:
+      raise ValueError("Lower level of the runt has to be below the upper level")
+    if polarity not in ("POS", "NEG"):
+      raise ValueError("Unknown polarity %s" % polarity)
+
+    self.source = source
+    self.low = low
+    self.high = high
+    self.polarity = polarity
+
+  def _start(self, channelDict):
+    _RunEvent._start(self, channelDict)
+    self._low = _voltsToThreshold(channelDict, self.low)
+    self._high = _voltsToThreshold(channelDict, self.high)
+
+  def _mask(self, chunk):
+    if self.polarity == "POS":
+      return _above(chunk, self._low)
+    else:
+      return _below(chunk, self._high)
+
+  def _flags(self, chunk):
+    if self.polarity == "POS":
+      return _above(chunk, self._high)
+    else:
+      return _below(chunk, self._low)
+
+  def _condition(self, lengths, flags):
+    return flags == 0
+
+class PulseWidth(_RunEvent):
+  """
+  Hits at the start of pulses of an analog channel (1 or 2) with a certain
+  width, like the pulse trigger. A positive pulse is above level, a negative
+  one below. The pulseType is one of PULSE_TYPES and compares the width of
+  the pulse with width (in seconds). For "=", the widths may differ by
+  the relative tolerance.
+  """
+
+  def __init__(self, source, level, pulseType, width, tolerance=0.05):
+    if pulseType not in PULSE_TYPES:
+      raise ValueError("Unknown pulse type %s" % pulseType)
+
+    self.source = source
+    self.level = level
+    self.pulseType = pulseType
+    self.width = width
+    self.tolerance = tolerance
+
+  def _start(self, channelDict):
+    _RunEvent._start(self, channelDict)
+    self._threshold = _voltsToThreshold(channelDict, self.level)
+
+  def _mask(self, chunk):
+    if self.pulseType.startswith("POS"):
+      return _above(chunk, self._threshold)
+    else:
+      return _below(chunk, self._threshold)
+
+  def _condition(self, lengths, flags):
+    widths = lengths * self._timeScale
+    comparison = self.pulseType[-1]
+
+    if comparison == ">":
+      return widths > self.width
+    elif comparison == "<":
+      return widths < self.width
+    else:
+      return np.abs(widths - self.width) <= self.tolerance * self.width
+
+class LAPattern(_TransitionEvent):
+  """
+  Hits when the logic analyzer channels start to match pattern. Only the
+  channels selected by mask are compared. By default, these are all enabled
+  channels.
+  """
+  source = 'LA'
+
+  def __init__(self, pattern, mask=None):
+    if mask is not None and pattern & ~mask:
+      raise ValueError("Pattern 0x%04x is not covered by mask 0x%04x" % (pattern, mask))
+
+    self.pattern = pattern
+    self.mask = mask
+
+  def _start(self, channelDict):
+    _TransitionEvent._start(self, channelDict)
+
+    enabled = channelDict["enabledChannelsMaskRaw"]
+    self._bits = enabled if self.mask is None else self.mask
+    if self._bits & ~enabled:
+      raise ValueError("LA channels 0x%04x of mask are not enabled" % (self._bits & ~enabled))
+    if self.pattern & ~self._bits:
+      raise ValueError("LA channels 0x%04x of pattern are not enabled" % (self.pattern & ~self._bits))
+
+  def _mask(self, chunk):
+    return (chunk & self._bits) == self.pattern
+
+
+def parseEvent(spec):
+  """
+  Create an event from a textual description. Voltages and widths are given
+  in volts and seconds. The following descriptions are known:
+
+    CH1:edge:LEVEL[:RISE|FALL|BOTH]
+    CH1:window:LOW:HIGH
+    CH1:runt:LOW:HIGH[:POS|NEG]
+    CH1:pulse:LEVEL:TYPE:WIDTH       e.g. "CH2:pulse:1.5:POS <:1e-6"
+    LA:pattern:PATTERN[:MASK]        e.g. "LA:pattern:0x0003:0x000f"
+  """
+  fields = spec.split(":")
+  if len(fields) < 3:
+    raise ValueError("Event %s is incomplete" % spec)
+
+  source, kind, args = fields[0], fields[1], fields[2:]
+
+  try:
+    if source in ("CH1", "CH2"):
+      source = int(source[2])
+
+      if kind == "edge" and len(args) in (1, 2):
+        return Edge(source, float(args[0]), *args[1:])
+      if kind == "window" and len(args) == 2:
+        return Window(source, float(args[0]), float(args[1]))
+      if kind == "runt" and len(args) in (2, 3):
+        return Runt(source, float(args[0]), float(args[1]), *args[2:])
+      if kind == "pulse" and len(args) == 3:
+        return PulseWidth(source, float(args[0]), args[1], float(args[2]))
+
+    elif source == "LA":
+      if kind == "pattern" and len(args) in (1, 2):
+        return LAPattern(*[int(arg, 0) for arg in args])
+
+  except ValueError as e:
+    raise ValueError("Event %s: %s" % (spec, e))
+
+  raise ValueError("Unknown event %s" % spec)
+
+def scanFile(filename, events, strict=True, chunkSize=CHUNK_SIZE, maxHits=MAX_HITS):
+  """
+  Scan a Rigol WFM file for events, without converting its samples.
+
+  The raw samples of every channel are read and scanned in chunks of
+  chunkSize samples and at most maxHits hits are recorded per event, so
+  memory usage does not depend on the length of the record.
+
+  Returns a list which contains the times (in seconds) of the hits of every
+  event and a list which tells for every event whether hits have been
+  dropped because of maxHits. Events of a channel which is not enabled have
+  no hits. Events which do not apply to the file, e.g. a pattern of LA
+  channels which are not enabled, are None.
+  """
+  hits = [[] for event in events]
+  truncated = [False for event in events]
+
+  with open(filename, 'rb') as f:
+    scopeData = wfm.parseRigolWFM(f, strict, loadSamples=False)
+
+    for source in (1, 2, 'LA'):
+      channelDict = scopeData["channel"][source]
+      if not channelDict["enabled"]:
+        continue
+
+      # Start a fresh copy of every event, as they keep state between chunks
+      scanners = dict()
+      for i, event in enumerate(events):
+        if event.source == source:
+          scanner = copy.copy(event)
+          try:
+            scanner._start(channelDict)
+          except ValueError:
+            hits[i] = None
+            continue
+          scanners[i] = scanner
+
+      if not scanners:
+        continue
+
+      dtype = np.dtype('<u2') if source == 'LA' else np.dtype('u1')
+      nsamples = channelDict["nsamples"]
+      f.seek(channelDict["dataOffset"])
+
+      for offset in range(0, nsamples, chunkSize):
+        count = min(chunkSize, nsamples - offset)
+        data = f.read(count * dtype.itemsize)
+        if len(data) != count * dtype.itemsize:
+          raise wfm.FormatError("File is truncated in the samples of channel %s" % source)
+        chunk = np.frombuffer(data, dtype=dtype)
+
+        for i, scanner in list(scanners.items()):
+          indices = scanner._feed(chunk, offset)
+
+          # Keep scanning after maxHits hits until one more is found, so
+          # that it is known whether hits have been dropped
+          room = maxHits - len(hits[i])
+          if len(indices) > room:
+            indices = indices[:room]
+            truncated[i] = True
+            del scanners[i]
+
+          times = (indices - nsamples/2) * channelDict["timeScale"] + channelDict["timeDelay"]
+          hits[i].extend(times.tolist())
+
+        if not scanners:
+          break
+
+  return hits, truncated
+
+def _scanFile(filename, events, kwargs):
+  """
+  Like scanFile, but returns a (filename, hits, truncated, error) tuple. If
+  the file could not be scanned, hits and truncated are None and error is
+  the exception.
+  """
+  try:
+    hits, truncated = scanFile(filename, events, **kwargs)
+    return filename, hits, truncated, None
+  # The parser also fails with AssertionError and LookupError on files with
+  # unknown header values
+  except (wfm.FormatError, AssertionError, LookupError, EnvironmentError) as e:
+    return filename, None, None, e
+
+def scanFiles(filenames, events, threads=None, **kwargs):
+  """
+  Scan several Rigol WFM files for events with scanFile. If threads is
+  given, this number of files is scanned in parallel. Only a few more files
+  than threads are scanned ahead of the one which is yielded next.
+
+  Yields a (filename, hits, truncated, error) tuple for every file in the
+  order of filenames. A file which can not be scanned does not stop the
+  others, its hits and truncated are None and error is the exception.
+  """
+  if not threads:
+    for filename in filenames:
+      yield _scanFile(filename, events, kwargs)
+    return
+
+  from concurrent.futures import ThreadPoolExecutor
+
+  with ThreadPoolExecutor(max_workers=threads) as pool:
+    pending = collections.deque()
+    for filename in filenames:
+      pending.append(pool.submit(_scanFile, filename, events, kwargs))
+      if len(pending) >= 2*threads:
+        yield pending.popleft().result()
+
+    while pending:
+      yield pending.popleft().result()
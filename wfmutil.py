@@ -2,7 +2,7 @@
 
 from __future__ import print_function, with_statement
 import argparse
-import collections
+import os
 import sys
 
 import wfm
@@ -31,190 +31,403 @@ import wfm
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 
-if __name__ == "__main__":
-  import argparse
-  import pprint
-  
-  parser = argparse.ArgumentParser(description='Rigol DS1000 series WFM file reader')
-  parser.add_argument('action', choices=['info', 'csv', 'plot', 'json', 'vcd', 'ols'], help="Action")
-  parser.add_argument('infile', type=argparse.FileType('rb'))
-  parser.add_argument('--forgiving', action='store_false', help="Lazier file parsing")
-  
-  args = parser.parse_args()
+def actionInfo(scopeData):
+  print(wfm.describeScopeData(scopeData))
   
-  try:
-    with args.infile as f:
-      scopeData = wfm.parseRigolWFM(f, args.forgiving)
-  except wfm.FormatError as e:
-    print("Format does not follow the known file format. Try the --forgiving option.", file=sys.stderr)
-    print("If you'd like to help development, please report this error:\n", file=sys.stderr)
-    print(e, file=sys.stderr)
-    sys.exit()
-  
-  scopeDataDsc = wfm.describeScopeData(scopeData)
-  
-  if args.action == "info":
-    print(scopeDataDsc)
+def actionCsv(scopeData):
+  if scopeData["alternateTrigger"]:
+    # In alternateTrigger mode, there are two time scales
+    assert scopeData["channel"][1]["nsamples"] == scopeData["channel"][2]["nsamples"]
     
-  if args.action == "csv":
-    if scopeData["alternateTrigger"]:
-      # In alternateTrigger mode, there are two time scales
-      assert scopeData["channel"][1]["nsamples"] == scopeData["channel"][2]["nsamples"]
-      
-      print("X(CH1),CH1,X(CH2),CH2,")
-      print("Second,Volt,Second,Volt,")
-      for i in range(scopeData["channel"][1]["nsamples"]):
-        for channel in range(1,3):
-          sampleDict = scopeData["channel"][channel]["samples"]
-          print("%0.5e,%0.2e," % (sampleDict["time"][i], sampleDict["volts"][i]), end='')
-        print()
-        
-    else:
-      nsamples = 0
-      channels = []
+    print("X(CH1),CH1,X(CH2),CH2,")
+    print("Second,Volt,Second,Volt,")
+    for i in range(scopeData["channel"][1]["nsamples"]):
       for channel in range(1,3):
-        if scopeData["channel"][channel]["enabled"]:
-          nsamples = max(nsamples, scopeData["channel"][channel]["nsamples"])
-          channels.append(channel)
-          
-      # Print first line with column source description
-      print("X,", end="")
-      for channel in channels:
-        print("%s," % scopeData["channel"][channel]["channelName"],end="")
+        sampleDict = scopeData["channel"][channel]["samples"]
+        print("%0.5e,%0.2e," % (sampleDict["time"][i], sampleDict["volts"][i]), end='')
       print()
       
-      # Print second line with column unit description
-      print("Second,", end="")
+  else:
+    nsamples = 0
+    channels = []
+    for channel in range(1,3):
+      if scopeData["channel"][channel]["enabled"]:
+        nsamples = max(nsamples, scopeData["channel"][channel]["nsamples"])
+        channels.append(channel)
+        
+    # Print first line with column source description
+    print("X,", end="")
+    for channel in channels:
+      print("%s," % scopeData["channel"][channel]["channelName"],end="")
+    print()
+    
+    # Print second line with column unit description
+    print("Second,", end="")
+    for channel in channels:
+      print("Volt,",end="")
+    print()
+    
+    for i in range(nsamples):
+      print("%0.5e," % scopeData["channel"][channels[0]]["samples"]["time"][i], end='')
       for channel in channels:
-        print("Volt,",end="")
+        sampleDict = scopeData["channel"][channel]["samples"]
+        print("%0.2e," % sampleDict["volts"][i], end='')
       print()
+    
+def actionPlot(scopeData):
+  import numpy as np
+  import matplotlib.pyplot as plt
+  import scipy
+  import scipy.fftpack
+  
+  hasAnalog = scopeData["channel"][1]["enabled"] | scopeData["channel"][2]["enabled"]
+  hasDigital = scopeData["channel"]['LA']["enabled"]
+  
+  if hasAnalog:
+    plt.subplot(211)
+  
+  if hasAnalog:
+    for i in range(2):
+      if scopeData["channel"][i+1]["enabled"]:
+        plt.plot(scopeData["channel"][i+1]["samples"]["time"], 
+                  scopeData["channel"][i+1]["samples"]["volts"])
+    plt.grid()
+    plt.ylabel("Voltage [V]")
+  
+  if hasAnalog & hasDigital:
+    plt.twinx()
+  
+  if hasDigital:
+    CHANNEL_SPACING = 1
+    CHANNEL_HIGHT = 0.8
+    
+    for channel in scopeData['channel']['LA']['enabledChannels']:
+      time = scopeData["channel"]['LA']["samples"]["time"]
+      data = scopeData["channel"]['LA']["samples"]["byChannel"][channel]
       
-      for i in range(nsamples):
-        print("%0.5e," % scopeData["channel"][channels[0]]["samples"]["time"][i], end='')
-        for channel in channels:
-          sampleDict = scopeData["channel"][channel]["samples"]
-          print("%0.2e," % sampleDict["volts"][i], end='')
-        print()
+      # Shift data to a correct position for display
+      channel_offset = CHANNEL_SPACING * scopeData["channel"]['LA']['position'][channel]
+      data_display = [d*CHANNEL_HIGHT + channel_offset for d in data]
       
-  if args.action == "plot":
-    import numpy as np
-    import matplotlib.pyplot as plt
-    import scipy
-    import scipy.fftpack
-    
-    hasAnalog = scopeData["channel"][1]["enabled"] | scopeData["channel"][2]["enabled"]
-    hasDigital = scopeData["channel"]['LA']["enabled"]
+      plt.plot(time, data_display)
+      plt.ylabel("Digital Channels")
+      plt.grid()
+  
+  plt.title("Waveform")
+  plt.xlabel("Time [s]")
+  
+  if hasAnalog:
+    plt.subplot(212)
+    for i in range(2):
+      channelDict = scopeData["channel"][i+1]
+      if channelDict["enabled"]:
+        
+        signal = np.array(channelDict["samples"]["volts"])
+        fft = np.abs(np.fft.fftshift(scipy.fft(signal)))
+        freqs = np.fft.fftshift(scipy.fftpack.fftfreq(signal.size, channelDict["timeScale"]))
+        plt.plot(freqs, 20 * np.log10(fft))
     
-    if hasAnalog:
-      plt.subplot(211)
+    plt.grid()
+    plt.title("FFT")
+    plt.ylabel("Magnitude [dB]")
+    plt.xlabel("Frequency [Hz]")
     
-    if hasAnalog:
-      for i in range(2):
-        if scopeData["channel"][i+1]["enabled"]:
-          plt.plot(scopeData["channel"][i+1]["samples"]["time"], 
-                    scopeData["channel"][i+1]["samples"]["volts"])
-      plt.grid()
-      plt.ylabel("Voltage [V]")
+  plt.show()
+  
+def actionJson(scopeData):
+  import json
+  import array
+  
+  class ArrayEncoder(json.JSONEncoder):
+    def default(self, obj):
+      if isinstance(obj, array.array):
+        return tuple(obj)
+      if hasattr(obj, 'tolist'):
+        # numpy arrays, as returned when using threads
+        return obj.tolist()
+      return json.JSONEncoder.default(self, obj)
     
-    if hasAnalog & hasDigital:
-      plt.twinx()
+  print(json.dumps(scopeData, cls=ArrayEncoder, indent=4, separators=(',', ': ')))
+  
+def actionVcd(scopeData):
+  if not scopeData["channel"]['LA']["enabled"]:
+    print("No logic channels enabled in file!", file=sys.stderr)
+    return False
     
-    if hasDigital:
-      CHANNEL_SPACING = 1
-      CHANNEL_HIGHT = 0.8
+  def stringSection(name, value = "", seperator=' '):
+    return '$%(name)s%(seperator)s%(value)s%(seperator)s$end' % {'name':name, 'value':value, 'seperator':seperator}
+  
+  print(stringSection("timescale", "%0.9fs" % scopeData["channel"]['LA']['timeScale']))
+  print(stringSection("scope", "module logic"))
+  
+  def channelToSymbol(c):
+    assert c >= 0 & c<16
+    return chr(ord('a') + c)
+  
+  for c in scopeData['channel']['LA']['enabledChannels']:
+    print(stringSection("var", "wire 1 %s D%02i" % (channelToSymbol(c), c)))
+   
+  print(stringSection("upscope"))
+  print(stringSection("enddefinitions"))
+  
+  lastState = None
+  for pos in range(scopeData['channel']['LA']['nsamples']):
+    currState = scopeData['channel']['LA']['samples']['raw'][pos]
+    if lastState != currState:
+      lastState = currState
       
-      for channel in scopeData['channel']['LA']['enabledChannels']:
-        time = scopeData["channel"]['LA']["samples"]["time"]
-        data = scopeData["channel"]['LA']["samples"]["byChannel"][channel]
-        
-        # Shift data to a correct position for display
-        channel_offset = CHANNEL_SPACING * scopeData["channel"]['LA']['position'][channel]
-        data_display = [d*CHANNEL_HIGHT + channel_offset for d in data]
+      print('#%i' % pos)
+      
+      for c in scopeData['channel']['LA']['enabledChannels']:
+        print('%i%s' % (scopeData['channel']['LA']['samples']['byChannel'][c][pos], channelToSymbol(c)))
         
-        plt.plot(time, data_display)
-        plt.ylabel("Digital Channels")
-        plt.grid()
+def actionOls(scopeData):
+  if not scopeData["channel"]['LA']["enabled"]:
+    print("No logic channels enabled in file!", file=sys.stderr)
+    return False
     
-    plt.title("Waveform")
-    plt.xlabel("Time [s]")
-    
-    if hasAnalog:
-      plt.subplot(212)
-      for i in range(2):
-        channelDict = scopeData["channel"][i+1]
-        if channelDict["enabled"]:
-          
-          signal = np.array(channelDict["samples"]["volts"])
-          fft = np.abs(np.fft.fftshift(scipy.fft(signal)))
-          freqs = np.fft.fftshift(scipy.fftpack.fftfreq(signal.size, channelDict["timeScale"]))
-          plt.plot(freqs, 20 * np.log10(fft))
-      
-      plt.grid()
-      plt.title("FFT")
-      plt.ylabel("Magnitude [dB]")
-      plt.xlabel("Frequency [Hz]")
+  
+  #print(";Size: %i" % scopeData['channel']['LA']['nsamples'])
+  print(";Rate: %i" % scopeData['channel']['LA']['samplerate'])
+  print(";Channels: 16")
+  print(";EnabledChannels: %i" % scopeData['channel']['LA']['enabledChannelsMaskRaw'])
+  #print(";TriggerPosition
+  
+  lastState = None
+  for pos in range(scopeData['channel']['LA']['nsamples']):
+    currState = scopeData['channel']['LA']['samples']['raw'][pos]
+    if lastState != currState:
+      lastState = currState
+      print('%x@%i' % (currState, pos))
       
-    plt.show()
+# Actions are only looked up by name, so that every action can defer its
+# own (possibly heavy) imports until it is actually run. The flag tells if
+# the action needs the samples or only the header of the file.
+ACTIONS = {
+  'info' : (actionInfo, False),
+  'csv'  : (actionCsv,  True),
+  'plot' : (actionPlot, True),
+  'json' : (actionJson, True),
+  'vcd'  : (actionVcd,  True),
+  'ols'  : (actionOls,  True),
+}
+
+def positiveInt(value):
+  """
+  argparse type for options which need a number of at least 1.
+  """
+  try:
+    number = int(value)
+  except ValueError:
+    number = 0
+  if number < 1:
+    raise argparse.ArgumentTypeError("%s is not a positive number" % value)
+  return number
+  
+def reportFormatError(e, infile=None):
+  if infile is not None:
+    print("%s:" % infile, file=sys.stderr)
+  print("Format does not follow the known file format. Try the --forgiving option.", file=sys.stderr)
+  print("If you'd like to help development, please report this error:\n", file=sys.stderr)
+  print(e, file=sys.stderr)
+  
+def scan(args):
+  """
+  Scan all files for events without converting their samples.
+  """
+  import wfmscan
+  
+  try:
+    events = [wfmscan.parseEvent(spec) for spec in args.event]
+  except ValueError as e:
+    print(e, file=sys.stderr)
+    sys.exit(-1)
     
-  if args.action == "json":
-    import json
-    import array
+  if not events:
+    print("No events given, use the --event option!", file=sys.stderr)
+    sys.exit(-1)
     
-    class ArrayEncoder(json.JSONEncoder):
-      def default(self, obj):
-        if isinstance(obj, array.array):
-          return tuple(obj)
-        return json.JSONEncoder.default(self, obj)
+  maxHits = args.max_hits or wfmscan.MAX_HITS
+  
+  # A file which can not be scanned does not stop the others, but is 
+  # reported by the exit code
+  failed = False
+  
+  for infile, hits, truncated, error in wfmscan.scanFiles(args.infile, events, args.threads, strict=args.forgiving, maxHits=maxHits):
+    if len(args.infile) > 1:
+      print("==> %s <==" % infile)
       
-    print(json.dumps(scopeData, cls=ArrayEncoder, indent=4, separators=(',', ': ')))
-    
-  if args.action == 'vcd':
-    if not scopeData["channel"]['LA']["enabled"]:
-      print("No logic channels enabled in file!", file=sys.stderr)
-      sys.exit(-1)
+    if isinstance(error, wfm.FormatError):
+      reportFormatError(error, infile)
+      failed = True
+      continue
+    elif error is not None:
+      print("%s: %s" % (infile, error), file=sys.stderr)
+      failed = True
+      continue
       
-    def stringSection(name, value = "", seperator=' '):
-      return '$%(name)s%(seperator)s%(value)s%(seperator)s$end' % {'name':name, 'value':value, 'seperator':seperator}
-    
-    print(stringSection("timescale", "%0.9fs" % scopeData["channel"]['LA']['timeScale']))
-    print(stringSection("scope", "module logic"))
-    
-    def channelToSymbol(c):
-      assert c >= 0 & c<16
-      return chr(ord('a') + c)
-    
-    for c in scopeData['channel']['LA']['enabledChannels']:
-      print(stringSection("var", "wire 1 %s D%02i" % (channelToSymbol(c), c)))
-     
-    print(stringSection("upscope"))
-    print(stringSection("enddefinitions"))
-    
-    lastState = None
-    for pos in range(scopeData['channel']['LA']['nsamples']):
-      currState = scopeData['channel']['LA']['samples']['raw'][pos]
-      if lastState != currState:
-        lastState = currState
+    print("Event,Second")
+    for spec, times, dropped in zip(args.event, hits, truncated):
+      if times is None:
+        print("%s: Event %s does not apply to this file, skipping it" % (infile, spec), file=sys.stderr)
+        continue
+      if dropped:
+        print("%s: Only the first %i hits of event %s are shown" % (infile, maxHits, spec), file=sys.stderr)
         
-        print('#%i' % pos)
+      for time in times:
+        print("%s,%0.5e" % (spec, time))
         
-        for c in scopeData['channel']['LA']['enabledChannels']:
-          print('%i%s' % (scopeData['channel']['LA']['samples']['byChannel'][c][pos], channelToSymbol(c)))
+  if failed:
+    sys.exit(-1)
+
+def pack(args):
+  """
+  Store all files in a single compressed archive. Files which can not be 
+  added are reported and skipped.
+  """
+  import wfmarchive
+  
+  if args.archive is None:
+    print("No archive given, use the --archive option!", file=sys.stderr)
+    sys.exit(-1)
+    
+  failed = False
+  
+  with open(args.archive, 'wb') as f:
+    with wfmarchive.ArchiveWriter(f) as writer:
+      for infile in args.infile:
+        try:
+          writer.add(infile, strict=args.forgiving)
+        except wfm.FormatError as e:
+          reportFormatError(e, infile)
+          failed = True
+        # The parser also fails with AssertionError and LookupError on files
+        # with unknown header values
+        except (wfmarchive.ArchiveError, AssertionError, LookupError, EnvironmentError) as e:
+          print("%s: %s" % (infile, e), file=sys.stderr)
+          failed = True
           
-  if args.action == 'ols':
-    if not scopeData["channel"]['LA']["enabled"]:
-      print("No logic channels enabled in file!", file=sys.stderr)
+      totalSize = sum(capture["size"] for capture in writer.captures)
+      
+  print("Packed %i files, %i bytes into %i bytes" % (len(writer.captures), totalSize, os.path.getsize(args.archive)))
+  
+  if failed:
+    sys.exit(-1)
+  
+def unpack(args):
+  """
+  Restore the original files of one or more archives into args.outdir. 
+  Captures which can not be restored are reported and skipped.
+  """
+  import wfmarchive
+  
+  if not os.path.isdir(args.outdir):
+    try:
+      os.makedirs(args.outdir)
+    except EnvironmentError as e:
+      print(e, file=sys.stderr)
       sys.exit(-1)
       
+  outdir = os.path.realpath(args.outdir)
+  failed = False
+  
+  for infile in args.infile:
+    try:
+      f = open(infile, 'rb')
+    except EnvironmentError as e:
+      print(e, file=sys.stderr)
+      failed = True
+      continue
+      
+    with f:
+      try:
+        reader = wfmarchive.ArchiveReader(f)
+      except wfmarchive.ArchiveError as e:
+        print("%s: %s" % (infile, e), file=sys.stderr)
+        failed = True
+        continue
+        
+      captures = []
+      for name in args.capture or reader.names():
+        try:
+          captures.append(reader.find(name))
+        except wfmarchive.ArchiveError as e:
+          print("%s: %s" % (infile, e), file=sys.stderr)
+          failed = True
+          
+      for capture in captures:
+        name = reader.captures[capture]["name"]
+        outfile = os.path.realpath(os.path.join(outdir, name))
+        
+        # Never write outside of outdir, whatever the archive says
+        if not wfmarchive.isSafeName(name) or os.path.dirname(outfile) != outdir:
+          print("%s: Capture name %s is not a plain file name, skipping it" % (infile, name), file=sys.stderr)
+          failed = True
+          continue
+          
+        if os.path.exists(outfile):
+          print("%s already exists, skipping it" % outfile, file=sys.stderr)
+          failed = True
+          continue
+          
+        try:
+          data = reader.readFile(capture)
+          with open(outfile, 'wb') as out:
+            out.write(data)
+        except (wfmarchive.ArchiveError, EnvironmentError) as e:
+          print("%s: %s: %s" % (infile, name, e), file=sys.stderr)
+          failed = True
+          continue
+          
+        print(outfile)
+        
+  if failed:
+    sys.exit(-1)
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description='Rigol DS1000 series WFM file reader')
+  parser.add_argument('action', choices=['info', 'csv', 'plot', 'json', 'vcd', 'ols', 'scan', 'pack', 'unpack'], help="Action")
+  parser.add_argument('infile', nargs='+', help="One or more WFM files (unpack: archives)")
+  parser.add_argument('--forgiving', action='store_false', help="Lazier file parsing")
+  parser.add_argument('--threads', type=positiveInt, default=None, help="Convert samples (scan: files) with this number of threads (requires numpy)")
+  parser.add_argument('--event', action='append', default=[], help="scan: Event to look for, e.g. CH1:edge:1.5:RISE (see wfmscan.parseEvent)")
+  parser.add_argument('--max-hits', type=positiveInt, default=None, help="scan: Maximum number of hits per event and file (default: 10000)")
+  parser.add_argument('--archive', help="pack: Archive to create")
+  parser.add_argument('--outdir', default=".", help="unpack: Directory to restore the files into")
+  parser.add_argument('--capture', action='append', default=[], help="unpack: Only restore the capture with this name")
+  
+  args = parser.parse_args()
+  
+  # These actions work on all files at once
+  if args.action in ('scan', 'pack', 'unpack'):
+    {'scan': scan, 'pack': pack, 'unpack': unpack}[args.action](args)
+    sys.exit()
     
-    #print(";Size: %i" % scopeData['channel']['LA']['nsamples'])
-    print(";Rate: %i" % scopeData['channel']['LA']['samplerate'])
-    print(";Channels: 16")
-    print(";EnabledChannels: %i" % scopeData['channel']['LA']['enabledChannelsMaskRaw'])
-    #print(";TriggerPosition
+  action, loadSamples = ACTIONS[args.action]
+  
+  # A broken file does not stop the others, but is reported by the exit code
+  failed = False
+  
+  for infile in args.infile:
+    # Like head(1), separate the output of several files by their name
+    if len(args.infile) > 1 and args.action != 'plot':
+      print("==> %s <==" % infile)
+      
+    try:
+      with open(infile, 'rb') as f:
+        scopeData = wfm.parseRigolWFM(f, args.forgiving, loadSamples, args.threads)
+    except wfm.FormatError as e:
+      reportFormatError(e, infile)
+      failed = True
+      continue
+    except EnvironmentError as e:
+      print("%s: %s" % (infile, e), file=sys.stderr)
+      failed = True
+      continue
+      
+    # Actions return False if they can not handle the file
+    if action(scopeData) is False:
+      failed = True
     
-    lastState = None
-    for pos in range(scopeData['channel']['LA']['nsamples']):
-      currState = scopeData['channel']['LA']['samples']['raw'][pos]
-      if lastState != currState:
-        lastState = currState
-        print('%x@%i' % (currState, pos))
\ No newline at end of file
+  if failed:
+    sys.exit(-1)